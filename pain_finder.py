@@ -3,52 +3,84 @@ import os
 from google import genai
 import sqlite3
 import hashlib
-import pandas as pd
+import hmac
+import secrets
+import threading
+import pyarrow as pa
 from typing import Optional 
 
 # --- データベース初期化 ---
-conn = sqlite3.connect('user_data.db')
-c = conn.cursor()
-
-# 1. ユーザーテーブルを最初に作成する (存在しなければ)
-#    → これで、後続のALTER TABLE操作（plan列の追加）が安全になる
-c.execute('''
-    CREATE TABLE IF NOT EXISTS users (
-        username TEXT PRIMARY KEY,
-        password TEXT,
-        plan TEXT DEFAULT "free" 
-    )
-''')
-conn.commit()
+DB_PATH = 'user_data.db'
+
+def init_db(conn: sqlite3.Connection):
+    """テーブルを作成する (get_conn から接続作成時に一度だけ呼ばれる)"""
+    c = conn.cursor()
+
+    # 1. ユーザーテーブルを最初に作成する (存在しなければ)
+    #    → これで、後続のALTER TABLE操作（plan列の追加）が安全になる
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            username TEXT PRIMARY KEY,
+            password TEXT,
+            salt TEXT,
+            plan TEXT NOT NULL DEFAULT 'free' CHECK(plan IN ('free', 'pro'))
+        )
+    ''')
+    conn.commit()
 
-# 2. テーブル作成後に、plan列を追加する関数を定義
-def add_plan_column():
-    """usersテーブルにplan列を追加（既に存在する場合は何もしない）"""
-    try:
+    # 2. plan列・salt列のない旧DBのみ移行する (列の有無を確認し、例外に頼らない)
+    user_columns = {row[1] for row in c.execute('PRAGMA table_info(users)')}
+    if 'plan' not in user_columns:
         # 新規ユーザーはデフォルトで"free"プラン
-        c.execute('ALTER TABLE users ADD COLUMN plan TEXT DEFAULT "free"')
+        c.execute("ALTER TABLE users ADD COLUMN plan TEXT NOT NULL DEFAULT 'free' CHECK(plan IN ('free', 'pro'))")
         conn.commit()
-    except sqlite3.OperationalError as e:
-        # すでにplan列が存在する場合は無視 (エラーを握りつぶす)
-        if "duplicate column name" not in str(e):
-            # plan列の追加に失敗した場合のみエラーを再発生させる
-            raise e
-
-# 3. plan列の存在を保証（テーブル作成後なので安全）
-add_plan_column() 
-
-# アイデア保存用のテーブルを作成
-c.execute('''
-    CREATE TABLE IF NOT EXISTS ideas (
-        id INTEGER PRIMARY KEY,
-        username TEXT,
-        input TEXT,
-        output TEXT,
-        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY(username) REFERENCES users(username)
-    )
-''')
-conn.commit()
+    if 'salt' not in user_columns:
+        # saltがNULLのユーザーは旧形式(SHA-256)のハッシュ。次回ログイン時にscryptへ移行する
+        c.execute('ALTER TABLE users ADD COLUMN salt TEXT')
+        conn.commit()
+
+    # アイデア保存用のテーブルを作成
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS ideas (
+            id INTEGER PRIMARY KEY,
+            username TEXT,
+            input TEXT,
+            output TEXT,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY(username) REFERENCES users(username)
+        )
+    ''')
+    # ユーザー別の履歴取得・件数取得 (WHERE username + ORDER BY timestamp DESC, id DESC) をインデックスで処理する
+    # (昇順インデックスを逆順に走査すると、末尾のrowid(id)も降順になり並べ替えが不要)
+    c.execute('DROP INDEX IF EXISTS idx_ideas_user_ts') # 旧定義 (timestamp DESC) はid DESCと順序が合わない
+    c.execute('CREATE INDEX IF NOT EXISTS idx_ideas_user_time ON ideas(username, timestamp)')
+    conn.commit()
+
+    # Geminiの応答キャッシュ (キーはプロンプトのSHA-256)
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS prompt_cache (
+            h TEXT PRIMARY KEY,
+            output TEXT,
+            ts DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.commit()
+
+@st.cache_resource
+def get_conn() -> sqlite3.Connection:
+    """プロセス全体で共有するSQLite接続を返す (再実行・セッション間で使い回す)"""
+    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+    # WAL + synchronous=NORMAL で書き込み時のfsyncを減らす
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute('PRAGMA temp_store=MEMORY')
+    init_db(conn)
+    return conn
+
+@st.cache_resource
+def get_write_lock() -> threading.Lock:
+    """共有接続への書き込みを直列化するロック (get_conn と同じくプロセス全体で1つ)"""
+    return threading.Lock()
 
 
 # --- 設定 ---
@@ -60,56 +92,119 @@ if not api_key:
     st.error("エラー: GEMINI_API_KEYが設定されていません。デプロイの際はStreamlit Secretsを設定してください。")
     st.stop()
 
-client = genai.Client(api_key=api_key)
+@st.cache_resource
+def get_genai_client() -> genai.Client:
+    """Geminiクライアントをプロセス全体で1つだけ作成して使い回す"""
+    return genai.Client(api_key=api_key)
+
 model_name = 'gemini-2.5-flash'
+HISTORY_PAGE_SIZE = 25 # 履歴タブの1ページあたりの表示件数
+MAX_FREE_COUNT = 5 # 無料ユーザーの最大保存数
+PROMPT_CACHE_TTL = 3600 # Geminiの応答キャッシュの有効期間 (秒)
 
+# 深掘り質問生成用のプロンプト (ユーザーの入力だけを差し込む)
+PROMPT_TEMPLATE: str = """
+あなたは最高のブレインストーミングアシスタントです。
+ユーザーが入力した「アイデアの種」を、具体的で実用的な3つの深掘り質問に変換してください。
+質問は、ユーザーが自分の問題点を明確にしたり、解決策のヒントを見つけるのに役立つものでなければなりません。
+ユーザーの入力: "{user_input}"
+期待する出力形式: 1. 〇〇 2. 〇〇 3. 〇〇
+"""
 
-# --- 認証・データ操作関数 ---
-def make_hashes(password: str) -> str:
-    """パスワードをハッシュ化"""
-    return hashlib.sha256(password.encode()).hexdigest()
 
-def check_hashes(password: str, hashed_text: str) -> bool:
-    """ハッシュ化されたパスワードの検証"""
-    return make_hashes(password) == hashed_text
+# --- 認証・データ操作関数 ---
+def make_hashes(password: str, salt: str) -> str:
+    """パスワードをscryptでハッシュ化 (saltはユーザーごとの16バイトの16進文字列)"""
+    return hashlib.scrypt(password.encode(), salt=bytes.fromhex(salt), n=2**14, r=8, p=1, dklen=32).hex()
+
+def check_hashes(password: str, hashed_text: str, salt: Optional[str]) -> bool:
+    """ハッシュ化されたパスワードの検証 (saltのない旧形式はSHA-256で検証)"""
+    if salt is None:
+        candidate = hashlib.sha256(password.encode()).hexdigest()
+    else:
+        candidate = make_hashes(password, salt)
+    return hmac.compare_digest(candidate, hashed_text)
 
 def add_user(username: str, password: str):
     """ユーザーをデータベースに追加 (デフォルトはfreeプラン)"""
-    hashed_password = make_hashes(password)
-    c.execute('INSERT INTO users (username, password, plan) VALUES (?,?,?)', (username, hashed_password, 'free'))
-    conn.commit()
+    salt = secrets.token_hex(16)
+    hashed_password = make_hashes(password, salt)
+    conn = get_conn()
+    # 他セッションの書き込みとトランザクションが混ざらないよう、ロック内でcommit/rollbackまで行う
+    with get_write_lock(), conn:
+        conn.execute('INSERT INTO users (username, password, salt, plan) VALUES (?,?,?,?)', (username, hashed_password, salt, 'free'))
+
+def update_password(username: str, password: str):
+    """新しいsaltでパスワードをscryptハッシュ化して保存し直す"""
+    salt = secrets.token_hex(16)
+    hashed_password = make_hashes(password, salt)
+    conn = get_conn()
+    with get_write_lock(), conn:
+        conn.execute('UPDATE users SET password = ?, salt = ? WHERE username = ?', (hashed_password, salt, username))
 
 def login_user(username: str, password: str) -> Optional[str]:
     """ログイン検証"""
-    c.execute('SELECT * FROM users WHERE username = ?', (username,))
+    c = get_conn().cursor()
+    c.execute('SELECT password, salt FROM users WHERE username = ?', (username,))
     user_record = c.fetchone()
-    if user_record and check_hashes(password, user_record[1]):
-        return user_record[0] # ユーザー名を返す
-    return None
+    if not user_record:
+        return None # 存在しないユーザーではKDFを実行しない
+    hashed_password, salt = user_record
+    if not check_hashes(password, hashed_password, salt):
+        return None
+    if salt is None:
+        # 旧形式(SHA-256)のハッシュは、ログインに成功した時点でscryptへ移行する
+        update_password(username, password)
+    return username # ユーザー名を返す
 
 def save_idea(username: str, user_input: str, ai_output: str):
-    """ユーザーの入力とAIの出力をデータベースに保存"""
-    c.execute(
-        'INSERT INTO ideas (username, input, output) VALUES (?, ?, ?)', 
-        (username, user_input, ai_output)
-    )
-    conn.commit()
+    """ユーザーの入力とAIの出力を保存キューに積み、まとめてデータベースに保存"""
+    st.session_state.setdefault('pending_ideas', []).append((username, user_input, ai_output))
+    flush_ideas()
+
+def flush_ideas():
+    """保存キューのアイデアを1トランザクションでまとめてINSERTする"""
+    # 失敗時もキューには残さない (エラーは表示済みで、再送すると無料プランの上限判定をすり抜けるため)
+    pending = st.session_state.pop('pending_ideas', None)
+    if not pending:
+        return
+    conn = get_conn()
+    with get_write_lock(), conn: # 成功時にまとめてcommit、失敗時はrollback
+        conn.executemany(
+            'INSERT INTO ideas (username, input, output) VALUES (?, ?, ?)', 
+            pending
+        )
+    # 新しいアイデアが先頭に入ると全ページの内容がずれるため、ページ単位ではなく全体をクリア
+    cached_ideas_page.clear()
+    cached_saved_count.clear()
 
-def get_user_ideas(username: str) -> list:
-    """ユーザーが保存したアイデアをすべて取得"""
+def get_user_ideas(username: str, limit: int = HISTORY_PAGE_SIZE, offset: int = 0) -> list:
+    """ユーザーが保存したアイデアを新しい順に limit 件取得 (履歴タブで表示する列のみ)
+
+    timestampは秒単位で同時刻が並ぶため、idを第2キーにして順序とページ境界を一意にする
+    """
+    c = get_conn().cursor()
     c.execute(
-        'SELECT id, timestamp, input, output FROM ideas WHERE username = ? ORDER BY timestamp DESC', 
-        (username,)
+        'SELECT timestamp, input, output FROM ideas WHERE username = ? ORDER BY timestamp DESC, id DESC LIMIT ? OFFSET ?', 
+        (username, limit, offset)
     )
     return c.fetchall()
 
-def count_user_ideas(username: str) -> int:
-    """ユーザーが保存したアイデアの総数を取得"""
-    c.execute('SELECT COUNT(*) FROM ideas WHERE username = ?', (username,))
+def count_user_ideas(username: str, limit: int) -> int:
+    """ユーザーが保存したアイデアの件数を取得 (limit 件まで数えたら打ち切る)"""
+    c = get_conn().cursor()
+    c.execute('SELECT COUNT(*) FROM (SELECT 1 FROM ideas WHERE username = ? LIMIT ?)', (username, limit))
     return c.fetchone()[0]
 
+def at_or_over_limit(username: str, limit: int) -> bool:
+    """保存数が limit 件に達しているかを判定 (COUNT(*)せず limit 件目の有無だけを見る)"""
+    c = get_conn().cursor()
+    c.execute('SELECT 1 FROM ideas WHERE username = ? LIMIT 1 OFFSET ?', (username, limit - 1))
+    return c.fetchone() is not None
+
 def get_user_plan(username: str) -> str:
     """ユーザーのプラン（free or pro）を取得"""
+    c = get_conn().cursor()
     c.execute('SELECT plan FROM users WHERE username = ?', (username,))
     result = c.fetchone()
     # デフォルト値は "free"
@@ -117,11 +212,145 @@ def get_user_plan(username: str) -> str:
 
 def upgrade_user_plan(username: str):
     """ユーザーのプランを 'pro' に更新する (決済完了後の処理を想定)"""
-    c.execute('UPDATE users SET plan = "pro" WHERE username = ?', (username,))
-    conn.commit()
+    conn = get_conn()
+    with get_write_lock(), conn:
+        conn.execute('UPDATE users SET plan = ? WHERE username = ?', ('pro', username))
+    cached_plan.clear(username)
+
+# 再実行のたびにSQLiteへ問い合わせないよう、プラン・保存数・履歴はキャッシュする (cached_* がキャッシュ版)
+# (値が変わるのは保存・アップグレード時のみなので、その時点でクリアする)
+@st.cache_data(ttl=300)
+def cached_plan(username: str) -> str:
+    """get_user_plan のキャッシュ版"""
+    return get_user_plan(username)
+
+@st.cache_data(ttl=300)
+def cached_ideas_page(username: str, page: int = 0) -> tuple[list, int]:
+    """get_user_ideas のキャッシュ版 (page ページ目 (0始まり) の行と、len(rows) で求めたその件数を返す)"""
+    rows = get_user_ideas(username, offset=page * HISTORY_PAGE_SIZE)
+    return rows, len(rows)
+
+@st.cache_data(ttl=300)
+def cached_saved_count(username: str) -> int:
+    """count_user_ideas のキャッシュ版 (無料プランのカウンター用に MAX_FREE_COUNT 件で打ち切る)"""
+    return count_user_ideas(username, MAX_FREE_COUNT)
+
+
+# --- Gemini 呼び出し ---
+def hash_prompt(prompt: str) -> str:
+    """prompt_cache のキー (プロンプトのSHA-256)"""
+    return hashlib.sha256(prompt.encode()).hexdigest()
+
+def get_cached_output(prompt_hash: str) -> Optional[str]:
+    """prompt_cache に保存済みのGeminiの出力を返す (未保存、または PROMPT_CACHE_TTL 秒より古ければ None)
+
+    主キー検索のみで十分速いため、有効期限がずれないよう st.cache_data は重ねない
+    """
+    row = get_conn().execute(
+        "SELECT output FROM prompt_cache WHERE h = ? AND ts >= datetime('now', ?)",
+        (prompt_hash, f'-{PROMPT_CACHE_TTL} seconds')
+    ).fetchone()
+    return row[0] if row else None
+
+def stream_questions(prompt: str, prompt_hash: str):
+    """Geminiの出力を受信したチャンクから順に返し、最後まで受信できたらprompt_cacheへ保存する (空の応答は保存しない)"""
+    stream = get_genai_client().models.generate_content_stream(
+        model=model_name,
+        contents=prompt
+    )
+    parts = []
+    for chunk in stream:
+        if chunk.text:
+            parts.append(chunk.text)
+            yield chunk.text
+
+    if not parts:
+        return # ブロック等で空の応答は、次回もGeminiに問い合わせ直す
+
+    conn = get_conn()
+    with get_write_lock(), conn:
+        conn.execute('INSERT OR REPLACE INTO prompt_cache (h, output) VALUES (?, ?)', (prompt_hash, ''.join(parts)))
+        # 期限切れの行はここでまとめて削除し、テーブルが増え続けないようにする
+        conn.execute("DELETE FROM prompt_cache WHERE ts < datetime('now', ?)", (f'-{PROMPT_CACHE_TTL} seconds',))
 
 
 # --- Streamlit UI ---
+def on_login_click():
+    """ログインボタン押下時のコールバック (入力中の再実行ではパスワード検証を行わない)"""
+    user = login_user(st.session_state['login_username'], st.session_state['login_password'])
+    if user:
+        st.session_state['logged_in_user'] = user
+    else:
+        st.session_state['login_failed'] = True
+
+@st.fragment
+def idea_panel(user: str, plan: str):
+    """アイデア生成タブ (フラグメントとして描画し、生成だけではアプリ全体を再実行しない)"""
+    can_save = True
+    # 保存時のアプリ全体の再実行をまたいで、直前に保存した生成結果を表示し直す
+    saved_output = st.session_state.pop('saved_output', None)
+
+    saved_count = cached_saved_count(user)
+    # 制限アラートの表示ロジック
+    if plan == 'free':
+        if saved_count >= MAX_FREE_COUNT:
+            st.warning(f"💡 無料プランの上限（{MAX_FREE_COUNT}件）に達しました。深掘り質問は可能ですが、保存はされません。Pro版をご利用ください！")
+            can_save = False
+        else:
+            st.info(f"💾 現在 {saved_count}/{MAX_FREE_COUNT} 件のアイデアを保存中です。（無料プラン）")
+    
+    # --------------------------------------------------------------------------------------
+    
+    # フォームにまとめ、入力中はフラグメントも再実行せずボタン押下時にだけ処理する
+    with st.form("idea_form", border=False):
+        user_input = st.text_area(
+            "あなたのアイデアの種を入力してください:",
+            height=150,
+            key="input_tab1" 
+        )
+        submitted = st.form_submit_button("深掘り質問を生成", key="generate_button_tab1")
+    
+    if submitted:
+        if user_input:
+            prompt = PROMPT_TEMPLATE.format(user_input=user_input)
+            try:
+                prompt_hash = hash_prompt(prompt)
+                st.subheader("🤖 Geminiからの深掘り質問")
+                ai_output = get_cached_output(prompt_hash)
+                if ai_output is None:
+                    # 生成完了を待たず、受信したトークンから順に表示する
+                    ai_output = st.write_stream(stream_questions(prompt, prompt_hash))
+                else:
+                    st.markdown(ai_output)
+                
+                if not ai_output:
+                    # 空の応答は表示する内容がなく、保存枠も消費させない
+                    st.warning("Geminiから回答が得られませんでした。入力内容を変えて再度お試しください。（保存はされていません）")
+                    return
+
+                if can_save and plan == 'free' and at_or_over_limit(user, MAX_FREE_COUNT):
+                    # 別セッションで保存済みの場合に備え、保存直前にDBで上限を再確認
+                    can_save = False
+
+                if can_save:
+                    # アイデア保存機能を有効化
+                    save_idea(user, user_input, ai_output)
+                    # 履歴タブにも反映させるため、保存したときだけアプリ全体を再実行する
+                    st.session_state['saved_output'] = ai_output
+                    st.rerun(scope="app")
+                else:
+                    st.info("保存数の上限を超えたため、今回は保存されませんでした。（Pro版へのアップグレードを推奨します）")
+
+
+            except Exception as e:
+                st.error(f"エラーが発生しました: {e}")
+        else:
+            st.warning("何か入力してください。")
+    elif saved_output is not None:
+        st.subheader("🤖 Geminiからの深掘り質問")
+        st.markdown(saved_output)
+        st.success("アイデアと質問を保存しました！")
+
 st.sidebar.title("アカウント認証")
 
 if 'logged_in_user' not in st.session_state:
@@ -130,7 +359,9 @@ if 'logged_in_user' not in st.session_state:
 if st.session_state['logged_in_user']:
     # ログイン後のメイン画面
     current_user = st.session_state['logged_in_user']
-    user_plan = get_user_plan(current_user)
+    user_plan = cached_plan(current_user)
+    history_page = st.session_state.get('history_page', 1)
+    ideas, page_count = cached_ideas_page(current_user, history_page - 1)
     
     st.sidebar.success(f"ようこそ、{current_user}さん！ (プラン: **{user_plan.upper()}**)")
     
@@ -141,79 +372,33 @@ if st.session_state['logged_in_user']:
 
     # --- タブ 1: アイデア生成 ---
     with tab1:
-        saved_count = count_user_ideas(current_user)
-        MAX_FREE_COUNT = 5 # 無料ユーザーの最大保存数
-        can_save = True
-
-        # 制限アラートの表示ロジック
-        if user_plan == 'free':
-            if saved_count >= MAX_FREE_COUNT:
-                st.warning(f"💡 無料プランの上限（{MAX_FREE_COUNT}件）に達しました。深掘り質問は可能ですが、保存はされません。Pro版をご利用ください！")
-                can_save = False
-            else:
-                 st.info(f"💾 現在 {saved_count}/{MAX_FREE_COUNT} 件のアイデアを保存中です。（無料プラン）")
-        
-        # --------------------------------------------------------------------------------------
-        
-        user_input = st.text_area(
-            "あなたのアイデアの種を入力してください:",
-            height=150,
-            key="input_tab1" 
-        )
-        
-        if st.button("深掘り質問を生成", key="generate_button_tab1"):
-            if user_input:
-                with st.spinner("Geminiが思考中..."):
-                    prompt = f"""
-                    あなたは最高のブレインストーミングアシスタントです。
-                    ユーザーが入力した「アイデアの種」を、具体的で実用的な3つの深掘り質問に変換してください。
-                    質問は、ユーザーが自分の問題点を明確にしたり、解決策のヒントを見つけるのに役立つものでなければなりません。
-                    ユーザーの入力: "{user_input}"
-                    期待する出力形式: 1. 〇〇 2. 〇〇 3. 〇〇
-                    """
-                    try:
-                        response = client.models.generate_content(
-                            model=model_name,
-                            contents=prompt
-                        )
-                        st.subheader("🤖 Geminiからの深掘り質問")
-                        st.markdown(response.text)
-                        
-                        if can_save:
-                            # アイデア保存機能を有効化
-                            save_idea(current_user, user_input, response.text)
-                            st.success("アイデアと質問を保存しました！") 
-                            st.rerun() # 保存後のカウンター更新のため再実行
-                        else:
-                            st.info("保存数の上限を超えたため、今回は保存されませんでした。（Pro版へのアップグレードを推奨します）")
-
-
-                    except Exception as e:
-                        st.error(f"エラーが発生しました: {e}")
-            else:
-                st.warning("何か入力してください。")
+        idea_panel(current_user, user_plan)
 
     # --- タブ 2: アイデア履歴 ---
     with tab2:
         st.subheader(f"{current_user}さんのアイデア履歴")
-        ideas = get_user_ideas(current_user)
+
+        if history_page > 1 or page_count == HISTORY_PAGE_SIZE:
+            # 1ページに収まらない場合のみページ送りを表示
+            st.number_input(f"ページ ({HISTORY_PAGE_SIZE}件ずつ表示)", min_value=1, step=1, key='history_page')
         
         if ideas:
-            # pandas DataFrameに変換して表示 (見やすくするため)
-            df = pd.DataFrame(
-                ideas, 
-                columns=['ID', '日時', '入力内容', '深掘り質問']
-            )
-            # 日時と入力内容のみをDataFrameとして表示
-            st.dataframe(df[['日時', '入力内容']], use_container_width=True, hide_index=True)
+            # 日時と入力内容のみをArrowテーブルとして表示 (pandasを経由せずst.dataframeに渡す)
+            table = pa.table({
+                '日時': pa.array([row[0] for row in ideas]).cast(pa.timestamp('s')),
+                '入力内容': pa.array([row[1] for row in ideas], pa.string()),
+            })
+            st.dataframe(table, use_container_width=True, hide_index=True)
             
-            # 詳細表示
+            # 詳細表示 (行ごとにSeriesを作らないよう、DataFrameではなく取得したタプルをそのまま回す)
             st.markdown("---")
-            for _, row in df.iterrows():
-                with st.expander(f"**[{row['日時']}]** {row['入力内容'][:50]}..."): # クリックして開く形式
-                    st.markdown(f"**入力内容:** {row['入力内容']}")
+            for timestamp, idea_input, idea_output in ideas:
+                with st.expander(f"**[{timestamp}]** {idea_input[:50]}..."): # クリックして開く形式
+                    st.markdown(f"**入力内容:** {idea_input}")
                     st.markdown("**AIの深掘り質問:**")
-                    st.markdown(row['深掘り質問'])
+                    st.markdown(idea_output)
+        elif history_page > 1:
+            st.info("このページに表示するアイデアはありません。")
         else:
             st.info("まだ保存されたアイデアはありません。")
 
@@ -246,15 +431,11 @@ else:
     menu = st.sidebar.selectbox("メニュー", ["ログイン", "ユーザー登録"])
 
     if menu == "ログイン":
-        username = st.sidebar.text_input("ユーザー名")
-        password = st.sidebar.text_input("パスワード", type='password')
-        if st.sidebar.button("ログイン"):
-            user = login_user(username, password)
-            if user:
-                st.session_state['logged_in_user'] = user
-                st.rerun() 
-            else:
-                st.sidebar.error("ユーザー名またはパスワードが違います")
+        st.sidebar.text_input("ユーザー名", key='login_username')
+        st.sidebar.text_input("パスワード", type='password', key='login_password')
+        st.sidebar.button("ログイン", on_click=on_login_click)
+        if st.session_state.pop('login_failed', False):
+            st.sidebar.error("ユーザー名またはパスワードが違います")
     
     elif menu == "ユーザー登録":
         new_user = st.sidebar.text_input("新しいユーザー名")